@@ -1,152 +1,423 @@
+import os
 import sys
-import json
+import asyncio
+import argparse
+import hashlib
+import orjson
+import tempfile
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from openrouter_text_client import OpenRouterClient, ModelConfig
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Annotated, Optional
+from typing_extensions import TypedDict
 
 
-class Epidemiology(BaseModel):
-    prevalence: Optional[str] = Field(None, description="How common is this condition? Include specific percentages or rates (e.g., '1 in 1000 people', '5% of adults')")
-    incidence: Optional[str] = Field(None, description="Rate of new cases per year. Include timeframe and population (e.g., '50,000 new cases annually in the US')")
-    risk_factors: list[str] = Field(default_factory=list, description="Specific factors that increase risk. Be concrete: 'smoking >20 pack-years' not just 'smoking'. Include 3-8 most significant factors")
-    demographics: Optional[str] = Field(None, description="Which populations are most affected? Include age, gender, ethnicity, geography with specifics")
+OUTPUT_DIR = Path("medical_topics")
+CACHE_DIR = OUTPUT_DIR / ".cache"
 
+_PROMPT_TEMPLATE = """You are a medical expert creating a comprehensive clinical reference on: {topic}
 
-class ClinicalPresentation(BaseModel):
-    symptoms: list[str] = Field(default_factory=list, description="Patient-reported experiences. Be specific about timing, severity, frequency (e.g., 'sharp chest pain lasting 2-5 minutes' not 'chest pain'). Include 5-10 most common")
-    signs: list[str] = Field(default_factory=list, description="Objective physical exam findings doctors observe (e.g., 'heart rate >100 bpm', 'bilateral crackles on lung auscultation'). Include 3-7 key findings")
-    onset: Optional[str] = Field(None, description="How does it start? Sudden/gradual? Over hours/days/years? Include typical age of onset")
-    severity_spectrum: Optional[str] = Field(None, description="Range from mild to severe with concrete examples of each level")
+CRITICAL INSTRUCTIONS:
+- Be SPECIFIC with numbers: percentages, rates, doses, thresholds, timeframes
+- Include QUANTITATIVE data wherever possible
+- Provide CONTEXT for statistics (e.g., "8% of US population" not just "25 million")
+- Use CONCRETE examples with actual values
+- Distinguish between different severity levels with numeric criteria
+- For medications: ALWAYS include dose, route, frequency
+- For tests: ALWAYS include cutoff values and units
+- For risk factors: quantify the risk increase when known
+- For complications: include approximate frequency/incidence
+- Avoid vague terms like "some", "often", "usually" - use percentages instead
+
+Provide comprehensive, evidence-based medical information covering:
+- Pathophysiology with specific mechanisms
+- Epidemiology with exact prevalence, incidence, and demographics
+- Risk factors with quantified risk levels
+- Clinical presentation with specific symptom patterns and timing
+- Complete diagnostic criteria with thresholds
+- Evidence-based treatments with exact regimens
+- Complications with frequency data
+- Prognosis with survival/outcome statistics"""
+
+
+class _SafeCharTable(dict):
+    """
+    str.translate table mapping non-alphanumeric characters to '_'.
+    
+    ASCII is prebuilt; other code points are classified on first use and memoized.
+    """
+    def __missing__(self, codepoint: int) -> int:
+        mapped = codepoint if chr(codepoint).isalnum() else ord("_")
+        self[codepoint] = mapped
+        return mapped
+
+
+_SAFE_TABLE = _SafeCharTable(
+    (cp, cp if chr(cp).isalnum() else ord("_")) for cp in range(128)
+)
 
 
-class DiagnosticApproach(BaseModel):
-    clinical_criteria: list[str] = Field(default_factory=list, description="Standardized diagnostic criteria or scoring systems (e.g., 'DSM-5 criteria', 'Jones criteria'). Include threshold values when applicable")
-    laboratory_tests: list[str] = Field(default_factory=list, description="Specific tests with normal vs abnormal ranges (e.g., 'HbA1c >6.5%', 'troponin elevation >99th percentile'). List 4-8 most useful tests")
-    imaging_studies: list[str] = Field(default_factory=list, description="What imaging shows and why it's ordered (e.g., 'chest X-ray shows bilateral infiltrates', 'MRI to detect lesions >3mm')")
-    differential_diagnosis: list[str] = Field(default_factory=list, description="Other conditions that present similarly and must be ruled out. Include 3-6 most important alternatives with key distinguishing features")
-    gold_standard: Optional[str] = Field(None, description="The definitive test that confirms diagnosis. Explain what makes it definitive (e.g., 'tissue biopsy showing granulomas')")
+class Epidemiology(TypedDict, total=False):
+    prevalence: Annotated[Optional[str], Field(description="How common is this condition? Include specific percentages or rates (e.g., '1 in 1000 people', '5% of adults')")]
+    incidence: Annotated[Optional[str], Field(description="Rate of new cases per year. Include timeframe and population (e.g., '50,000 new cases annually in the US')")]
+    risk_factors: Annotated[list[str], Field(description="Specific factors that increase risk. Be concrete: 'smoking >20 pack-years' not just 'smoking'. Include 3-8 most significant factors")]
+    demographics: Annotated[Optional[str], Field(description="Which populations are most affected? Include age, gender, ethnicity, geography with specifics")]
 
 
-class TreatmentPlan(BaseModel):
-    pharmacological: list[str] = Field(default_factory=list, description="Specific medications with typical doses, routes, frequency (e.g., 'metformin 500mg PO BID', 'lisinopril 10-40mg daily'). Include drug classes and mechanisms. List 4-8 options")
-    non_pharmacological: list[str] = Field(default_factory=list, description="Therapies beyond drugs: physical therapy protocols, psychotherapy types, devices, procedures. Be specific about techniques and frequency")
-    surgical: list[str] = Field(default_factory=list, description="Surgical interventions with indications for when they're needed (e.g., 'coronary bypass for 3-vessel disease'). Include success rates if significant")
-    lifestyle_modifications: list[str] = Field(default_factory=list, description="Concrete, actionable changes with targets (e.g., '150 min/week moderate exercise', 'sodium <2g/day', 'quit smoking')")
-    first_line: Optional[str] = Field(None, description="What do doctors try first and why? Include evidence level (e.g., 'Class I recommendation')")
-    duration: Optional[str] = Field(None, description="How long does treatment last? Distinguish acute vs maintenance phases if applicable")
+class ClinicalPresentation(TypedDict, total=False):
+    symptoms: Annotated[list[str], Field(description="Patient-reported experiences. Be specific about timing, severity, frequency (e.g., 'sharp chest pain lasting 2-5 minutes' not 'chest pain'). Include 5-10 most common")]
+    signs: Annotated[list[str], Field(description="Objective physical exam findings doctors observe (e.g., 'heart rate >100 bpm', 'bilateral crackles on lung auscultation'). Include 3-7 key findings")]
+    onset: Annotated[Optional[str], Field(description="How does it start? Sudden/gradual? Over hours/days/years? Include typical age of onset")]
+    severity_spectrum: Annotated[Optional[str], Field(description="Range from mild to severe with concrete examples of each level")]
 
 
-class PrognosisOutcome(BaseModel):
-    overall_prognosis: Optional[str] = Field(None, description="What's the typical outcome? Include survival rates, cure rates, or quality of life impact with timeframes (e.g., '5-year survival 85%', 'most recover fully in 6-12 months')")
-    factors_affecting_outcome: list[str] = Field(default_factory=list, description="What makes prognosis better or worse? Be specific (e.g., 'early diagnosis improves 10-year survival by 40%', 'age >65 doubles mortality risk')")
-    survival_rates: Optional[str] = Field(None, description="Specific survival statistics by stage/severity with timeframes (1-year, 5-year, 10-year)")
-    chronic_considerations: Optional[str] = Field(None, description="For chronic conditions: monitoring frequency, long-term complications to watch for, quality of life impacts")
+class DiagnosticApproach(TypedDict, total=False):
+    clinical_criteria: Annotated[list[str], Field(description="Standardized diagnostic criteria or scoring systems (e.g., 'DSM-5 criteria', 'Jones criteria'). Include threshold values when applicable")]
+    laboratory_tests: Annotated[list[str], Field(description="Specific tests with normal vs abnormal ranges (e.g., 'HbA1c >6.5%', 'troponin elevation >99th percentile'). List 4-8 most useful tests")]
+    imaging_studies: Annotated[list[str], Field(description="What imaging shows and why it's ordered (e.g., 'chest X-ray shows bilateral infiltrates', 'MRI to detect lesions >3mm')")]
+    differential_diagnosis: Annotated[list[str], Field(description="Other conditions that present similarly and must be ruled out. Include 3-6 most important alternatives with key distinguishing features")]
+    gold_standard: Annotated[Optional[str], Field(description="The definitive test that confirms diagnosis. Explain what makes it definitive (e.g., 'tissue biopsy showing granulomas')")]
+
+
+class TreatmentPlan(TypedDict, total=False):
+    pharmacological: Annotated[list[str], Field(description="Specific medications with typical doses, routes, frequency (e.g., 'metformin 500mg PO BID', 'lisinopril 10-40mg daily'). Include drug classes and mechanisms. List 4-8 options")]
+    non_pharmacological: Annotated[list[str], Field(description="Therapies beyond drugs: physical therapy protocols, psychotherapy types, devices, procedures. Be specific about techniques and frequency")]
+    surgical: Annotated[list[str], Field(description="Surgical interventions with indications for when they're needed (e.g., 'coronary bypass for 3-vessel disease'). Include success rates if significant")]
+    lifestyle_modifications: Annotated[list[str], Field(description="Concrete, actionable changes with targets (e.g., '150 min/week moderate exercise', 'sodium <2g/day', 'quit smoking')")]
+    first_line: Annotated[Optional[str], Field(description="What do doctors try first and why? Include evidence level (e.g., 'Class I recommendation')")]
+    duration: Annotated[Optional[str], Field(description="How long does treatment last? Distinguish acute vs maintenance phases if applicable")]
+
+
+class PrognosisOutcome(TypedDict, total=False):
+    overall_prognosis: Annotated[Optional[str], Field(description="What's the typical outcome? Include survival rates, cure rates, or quality of life impact with timeframes (e.g., '5-year survival 85%', 'most recover fully in 6-12 months')")]
+    factors_affecting_outcome: Annotated[list[str], Field(description="What makes prognosis better or worse? Be specific (e.g., 'early diagnosis improves 10-year survival by 40%', 'age >65 doubles mortality risk')")]
+    survival_rates: Annotated[Optional[str], Field(description="Specific survival statistics by stage/severity with timeframes (1-year, 5-year, 10-year)")]
+    chronic_considerations: Annotated[Optional[str], Field(description="For chronic conditions: monitoring frequency, long-term complications to watch for, quality of life impacts")]
 
 
 class MedicalTopic(BaseModel):
     condition_name: str = Field(..., description="Official medical name, not slang or abbreviations")
     summary: str = Field(..., description="2-3 sentence overview covering WHAT it is, WHO it affects, and WHY it matters. Write for educated non-medical audience")
     category: str = Field(..., description="Primary medical specialty/system (e.g., 'Cardiovascular', 'Infectious Disease', 'Endocrine', 'Neurological')")
-    icd_codes: list[str] = Field(default_factory=list, description="ICD-10 or ICD-11 codes in format like 'E11.9' with brief label")
+    icd_codes: Optional[list[str]] = Field(None, description="ICD-10 or ICD-11 codes in format like 'E11.9' with brief label")
     pathophysiology: Optional[str] = Field(None, description="Explain the biological mechanism in 3-5 sentences. HOW does the disease process work at cellular/organ level? What breaks down? Use analogies when helpful")
-    etiology: list[str] = Field(default_factory=list, description="ROOT CAUSES not just risk factors. Include genetic, environmental, infectious agents, autoimmune triggers. Be specific (e.g., 'HBV infection' not 'viral infection')")
-    types: list[str] = Field(default_factory=list, description="Subtypes or classifications with key differentiating features (e.g., 'Type 1: autoimmune, childhood onset' vs 'Type 2: insulin resistance, adult onset')")
-    stages: list[str] = Field(default_factory=list, description="Disease progression stages with clinical features of each (e.g., 'Stage 1: GFR >90, no symptoms')")
+    etiology: Optional[list[str]] = Field(None, description="ROOT CAUSES not just risk factors. Include genetic, environmental, infectious agents, autoimmune triggers. Be specific (e.g., 'HBV infection' not 'viral infection')")
+    types: Optional[list[str]] = Field(None, description="Subtypes or classifications with key differentiating features (e.g., 'Type 1: autoimmune, childhood onset' vs 'Type 2: insulin resistance, adult onset')")
+    stages: Optional[list[str]] = Field(None, description="Disease progression stages with clinical features of each (e.g., 'Stage 1: GFR >90, no symptoms')")
     epidemiology: Optional[Epidemiology] = Field(None, description="Population-level statistics and risk factors")
     clinical_presentation: Optional[ClinicalPresentation] = Field(None, description="How patients present and what doctors observe")
-    diagnosis: DiagnosticApproach = Field(default_factory=DiagnosticApproach, description="How to confirm the diagnosis")
-    treatment: TreatmentPlan = Field(default_factory=TreatmentPlan, description="How to manage the condition")
-    complications: list[str] = Field(default_factory=list, description="What can go wrong if untreated or poorly managed? Include acute and chronic complications with approximate frequency/timing")
+    diagnosis: Optional[DiagnosticApproach] = Field(None, description="How to confirm the diagnosis")
+    treatment: Optional[TreatmentPlan] = Field(None, description="How to manage the condition")
+    complications: Optional[list[str]] = Field(None, description="What can go wrong if untreated or poorly managed? Include acute and chronic complications with approximate frequency/timing")
     prognosis: Optional[PrognosisOutcome] = Field(None, description="Expected outcomes and what influences them")
-    prevention: list[str] = Field(default_factory=list, description="Evidence-based prevention strategies with efficacy data when available (e.g., 'vaccination reduces risk by 90%')")
-    related_conditions: list[str] = Field(default_factory=list, description="Conditions that commonly co-occur or share pathophysiology. Explain the relationship briefly")
-    key_considerations: list[str] = Field(default_factory=list, description="CLINICAL PEARLS: non-obvious insights, common pitfalls, important nuances that medical students/practitioners should know")
-    references: list[str] = Field(default_factory=list, description="Major clinical guidelines or landmark studies (e.g., 'AHA/ACC 2023 Guidelines', 'Framingham Heart Study')")
+    prevention: Optional[list[str]] = Field(None, description="Evidence-based prevention strategies with efficacy data when available (e.g., 'vaccination reduces risk by 90%')")
+    related_conditions: Optional[list[str]] = Field(None, description="Conditions that commonly co-occur or share pathophysiology. Explain the relationship briefly")
+    key_considerations: Optional[list[str]] = Field(None, description="CLINICAL PEARLS: non-obvious insights, common pitfalls, important nuances that medical students/practitioners should know")
+    references: Optional[list[str]] = Field(None, description="Major clinical guidelines or landmark studies (e.g., 'AHA/ACC 2023 Guidelines', 'Framingham Heart Study')")
 
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python script.py <medical_topic> [model1 model2 ...]")
-        print("Example: python script.py diabetes mistral gpt-4 claude")
-        sys.exit(1)
+@lru_cache(maxsize=1)
+def schema_hash() -> str:
+    """
+    Hash of the MedicalTopic schema, so that schema changes invalidate cached answers.
+    """
+    schema = orjson.dumps(MedicalTopic.model_json_schema(), option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(schema).hexdigest()
+
+
+def load_trusted(path: Path) -> MedicalTopic:
+    """
+    Load a MedicalTopic written by this script without re-validating it.
     
-    # Parse arguments
-    topic = sys.argv[1]
-    models = sys.argv[2:] if len(sys.argv) > 2 else ["mistral"]
+    Only use this for files produced from an already validated MedicalTopic.
+    Never apply it to raw LLM output, which must go through model validation.
+    The nested sections are TypedDicts, so the parsed dicts are used as is.
+    """
+    payload = orjson.loads(path.read_bytes())
+    return MedicalTopic.model_construct(**payload)
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    """
+    Write a file so that readers see either the old or the complete new content.
     
-    prompt = f"""You are a medical expert creating a comprehensive clinical reference on: {topic}
+    The data goes to a temporary file in the same directory, which is then
+    renamed over path.
+    """
+    with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".tmp", delete=False) as f:
+        f.write(data)
+    os.replace(f.name, path)
 
-CRITICAL INSTRUCTIONS:
-- Be SPECIFIC with numbers: percentages, rates, doses, thresholds, timeframes
-- Include QUANTITATIVE data wherever possible
-- Provide CONTEXT for statistics (e.g., "8% of US population" not just "25 million")
-- Use CONCRETE examples with actual values
-- Distinguish between different severity levels with numeric criteria
-- For medications: ALWAYS include dose, route, frequency
-- For tests: ALWAYS include cutoff values and units
-- For risk factors: quantify the risk increase when known
-- For complications: include approximate frequency/incidence
-- Avoid vague terms like "some", "often", "usually" - use percentages instead
 
-Provide comprehensive, evidence-based medical information covering:
-- Pathophysiology with specific mechanisms
-- Epidemiology with exact prevalence, incidence, and demographics
-- Risk factors with quantified risk levels
-- Clinical presentation with specific symptom patterns and timing
-- Complete diagnostic criteria with thresholds
-- Evidence-based treatments with exact regimens
-- Complications with frequency data
-- Prognosis with survival/outcome statistics"""
+async def cached_generate(client: OpenRouterClient, model: str, prompt: str) -> MedicalTopic:
+    """
+    Generate a MedicalTopic, reusing the stored answer for an identical request.
+    
+    Answers are cached on disk under CACHE_DIR, keyed by the resolved model
+    name, the schema hash and the prompt.
+    """
+    full_model = client.resolve_model(model)
+    key = hashlib.sha256(f"{full_model}|{schema_hash()}|{prompt}".encode()).hexdigest()
+    cache_file = CACHE_DIR / f"{key}.json"
+    
+    if cache_file.exists():
+        try:
+            cached = load_trusted(cache_file)
+        except (OSError, ValueError, TypeError):
+            # Unreadable entry, e.g. from an older interrupted write; query again
+            print(f"  Ignoring unreadable cache entry for {model}", file=sys.stderr)
+        else:
+            print(f"  Cache hit for {model}", file=sys.stderr)
+            return cached
+    
+    response = await client.agenerate_structured(
+        user_prompt=prompt,
+        response_model=MedicalTopic,
+        model=model,
+        temperature=0.3
+    )
+    
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    write_atomic(cache_file, response.model_dump_json().encode())
+    return response
+
+
+async def query_one(client: OpenRouterClient, model: str, prompt: str) -> dict:
+    """
+    Query a single model and build its answer entry.
+    
+    Errors are recorded in the entry instead of raised so that one failing
+    model does not cancel the others. A successful entry holds the
+    MedicalTopic itself under "data"; callers serialize it for their output.
+    """
+    print(f"  Querying {model}...", file=sys.stderr)
+    
+    try:
+        response = await cached_generate(client, model, prompt)
+        return {
+            "model": model,
+            "timestamp": datetime.now().isoformat(),
+            "data": response
+        }
+    except Exception as e:
+        print(f"  Error with {model}: {e}", file=sys.stderr)
+        return {
+            "model": model,
+            "timestamp": datetime.now().isoformat(),
+            "error": str(e)
+        }
+
+
+async def query_models(client: OpenRouterClient, prompt: str, models: list[str]) -> list[dict]:
+    """
+    Query all models concurrently through a single shared client.
+    
+    Returns:
+        Answer entries in the same order as models
+    """
+    try:
+        return await asyncio.gather(*(query_one(client, model, prompt) for model in models))
+    finally:
+        await client.aclose()
+
+
+def drop_partial_line(results_file: Path) -> None:
+    """
+    Truncate a partially written last line left by an interrupted run.
+    
+    New results are appended to the file, so a torn line would otherwise be
+    glued onto the first new record and make that record unreadable too.
+    """
+    if not results_file.exists():
+        return
+    
+    with open(results_file, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        f.seek(end - 1)
+        if f.read(1) == b"\n":
+            return
+        
+        # Scan backwards in blocks for the last complete line
+        pos = end
+        while pos > 0:
+            size = min(65536, pos)
+            pos -= size
+            f.seek(pos)
+            newline = f.read(size).rfind(b"\n")
+            if newline != -1:
+                f.truncate(pos + newline + 1)
+                return
+        f.truncate(0)
+
+
+def completed_pairs(results_file: Path) -> set[tuple[str, str]]:
+    """
+    Collect the (topic, model) pairs already saved in a batch results file.
+    
+    Unreadable lines are skipped, so their pairs are queried again.
+    """
+    done = set()
+    if not results_file.exists():
+        return done
+    
+    with open(results_file, 'rb') as f:
+        for line in f:
+            try:
+                entry = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue
+            done.add((entry["topic"], entry["model"]))
+    return done
+
+
+async def run_batch(
+    client: OpenRouterClient,
+    topics: list[str],
+    models: list[str],
+    concurrency: int
+) -> Path:
+    """
+    Query every topic against every model, appending results to a JSONL file.
+    
+    Each model gets its own concurrency limit, and all requests share one
+    client. Only successful answers are written, so rerunning the same batch
+    resumes with the pairs that are missing or previously failed.
+    
+    Returns:
+        Path of the results file
+    """
+    results_file = OUTPUT_DIR / "results.jsonl"
+    drop_partial_line(results_file)
+    done = completed_pairs(results_file)
+    pending = [(topic, model) for topic in topics for model in models if (topic, model) not in done]
+    print(f"Pending requests: {len(pending)} ({len(done)} already done)", file=sys.stderr)
+    
+    semaphores = {model: asyncio.Semaphore(concurrency) for model in models}
+    
+    with open(results_file, 'ab') as f:
+        async def run(topic: str, model: str) -> None:
+            async with semaphores[model]:
+                entry = await query_one(client, model, _PROMPT_TEMPLATE.format(topic=topic))
+            if "data" in entry:
+                # Compact JSONL, so the model's own JSON is spliced in as is
+                data = orjson.Fragment(entry["data"].model_dump_json())
+                f.write(orjson.dumps({"topic": topic, **entry, "data": data}) + b"\n")
+                f.flush()
+        
+        try:
+            await asyncio.gather(*(run(topic, model) for topic, model in pending))
+        finally:
+            await client.aclose()
+    
+    return results_file
+
+
+def run_single(client: OpenRouterClient, topic: str, models: list[str]) -> None:
+    """
+    Query all models for one topic and add the answers to its topic file.
+    """
+    prompt = _PROMPT_TEMPLATE.format(topic=topic)
     
     print(f"Generating information on: {topic}", file=sys.stderr)
     print(f"Using models: {', '.join(models)}", file=sys.stderr)
     
     # Setup output file
-    output_dir = Path("medical_topics")
-    output_dir.mkdir(exist_ok=True)
-    safe_topic = "".join(c if c.isalnum() else "_" for c in topic)
-    json_file = output_dir / f"{safe_topic}.json"
+    safe_topic = topic.translate(_SAFE_TABLE)
+    json_file = OUTPUT_DIR / f"{safe_topic}.json"
     
     # Load existing file or create new structure
     if json_file.exists():
-        with open(json_file, 'r') as f:
-            output = json.load(f)
+        output = orjson.loads(json_file.read_bytes())
     else:
         output = {
             "topic": topic,
             "answers": []
         }
     
-    # Query each model and append immediately
-    for model in models:
-        print(f"  Querying {model}...", file=sys.stderr)
-        
-        try:
-            client = OpenRouterClient(config=ModelConfig(model=model, temperature=0.3))
-            response = client.generate_structured(
-                user_prompt=prompt,
-                response_model=MedicalTopic
-            )
-            
-            # Append new response
-            output["answers"].append({
-                "model": model,
-                "timestamp": datetime.now().isoformat(),
-                "data": response.model_dump()
-            })
-            
-        except Exception as e:
-            print(f"  Error with {model}: {e}", file=sys.stderr)
-            output["answers"].append({
-                "model": model,
-                "timestamp": datetime.now().isoformat(),
-                "error": str(e)
-            })
-        
-        with open(json_file, 'w') as f:
-            json.dump(output, f, indent=2)
+    # Query all models concurrently and write the file once
+    answers = asyncio.run(query_models(client, prompt, models))
+    for entry in answers:
+        if "data" in entry:
+            # Fragments would be written unindented, so the readable file gets dicts
+            entry["data"] = entry["data"].model_dump(mode="json")
+    output["answers"].extend(answers)
+    
+    json_file.write_bytes(orjson.dumps(output, option=orjson.OPT_INDENT_2))
     
     print(f"\nSaved: {json_file}", file=sys.stderr)
-    print(f"Total responses: {len([r for r in output['responses'] if 'data' in r])}", file=sys.stderr)
+    print(f"Total responses: {sum(1 for r in output['answers'] if 'data' in r)}", file=sys.stderr)
+
+
+def main():
+    """
+    Main function to parse arguments and generate medical topic references.
+    """
+    parser = argparse.ArgumentParser(
+        description="Generate structured medical topic references with one or more models",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python cli_medtopic.py diabetes mistral gpt llama
+  python cli_medtopic.py --topics topics.txt --models mistral llama --concurrency 8
+        """
+    )
+    
+    parser.add_argument(
+        "topic",
+        nargs="?",
+        help="Medical topic to look up (not used with --topics)"
+    )
+    parser.add_argument(
+        "models",
+        nargs="*",
+        help="Model aliases or full names for the topic (default: mistral)"
+    )
+    parser.add_argument(
+        "--topics",
+        type=Path,
+        help="File with one topic per line; results go to medical_topics/results.jsonl"
+    )
+    parser.add_argument(
+        "--models",
+        dest="option_models",
+        nargs="+",
+        default=[],
+        metavar="MODEL",
+        help="Model aliases or full names; required form with --topics (default: mistral)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=16,
+        help="Maximum concurrent requests per model with --topics (default: 16)"
+    )
+    
+    args = parser.parse_args()
+    
+    if args.topics:
+        if args.topic:
+            parser.error("--topics does not take a positional topic; pass models with --models")
+    elif not args.topic:
+        parser.error("a topic or --topics is required")
+    models = args.models + args.option_models or ["mistral"]
+    
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    client = OpenRouterClient(
+        config=ModelConfig(temperature=0.3),
+        max_concurrency=args.concurrency * len(models)
+    )
+    
+    if args.topics:
+        topics = [line.strip() for line in args.topics.read_text().splitlines() if line.strip()]
+        results_file = asyncio.run(run_batch(client, topics, models, args.concurrency))
+        print(f"\nSaved: {results_file}", file=sys.stderr)
+    else:
+        run_single(client, args.topic, models)
+
+
+if __name__ == "__main__":
+    main()
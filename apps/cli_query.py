@@ -1,62 +1,42 @@
 
 from openai import OpenAI
+import functools
+import httpx
 import os
 import argparse
 import sys
 
-client = OpenAI(
-  base_url="https://openrouter.ai/api/v1",
-  api_key= os.getenv("OPENROUTER_API_KEY")
-)
-
-TEXT_MODELS = {
-    "deepseek": "deepseek/deepseek-chat-v3.1:free",
-    "deepseek-r1": "deepseek/deepseek-r1:free",
-    "glm": "z-ai/glm-4.5-air:free",
-    "gpt-oss": "openai/gpt-oss-20b:free",
-    "gemma3n": "google/gemma-3n-e4b-it:free",
-    "grok": "x-ai/grok-4-fast:free",
-    "hunyuan": "tencent/hunyuan-a13b-instruct:free",
-    "kimi": "moonshotai/kimi-dev-72b:free",
-    "llama3": "meta-llama/llama-3.3-8b-instruct:free",
-    "minimax": "minimax/minimax-m2:free",
-    "nemotron9b": "nvidia/nemotron-nano-9b-v2:free",
-    "nemotron12b": "nvidia/nemotron-nano-12b-v2-vl:free",
-    "qwen-14b": "qwen/qwen3-14b:free",
-    "qwen-30b": "qwen/qwen3-30b-a3b:free",
-    "qwen-235b": "qwen/qwen3-235b-a22b:free",
-}       
-
-VISION_MODELS = {                                                      
-    "llama4": "meta-llama/llama-4-maverick:free",                      
-    "gemma27b": "google/gemma-3-27b-it:free",                          
-    "mistral": "mistralai/mistral-small-3.2-24b-instruct:free",        
-    "haiku": "anthropic/claude-haiku-4.5",                             
-    "sonnet"   : "anthropic/claude-sonnet-4.5",                        
-    "sonar": "perplexity/sonar",                                       
-    "sonar-pro": "perplexity/sonar-pro",                               
-    "sonar-research": "perplexity/sonar-deep-research",                
-    "sonar-search": "perplexity/sonar-pro-search",                     
-    "sonar-reason": "perplexity/sonar-reasoning-pro",                  
-}                                                                      
-
-MODELS = TEXT_MODELS + VISION_MODELS                                   
-
-def ask_llm(query, model_name="deepseek"):
+# Read-only alias -> model lookup; argparse choices enforce valid aliases on the CLI
+from openrouter_client import MODEL_ALIASES as MODELS
+
+@functools.lru_cache(maxsize=1)
+def _client():
+    """Create the OpenAI client on first use so importing this module stays cheap."""
+    return OpenAI(
+      base_url="https://openrouter.ai/api/v1",
+      api_key= os.getenv("OPENROUTER_API_KEY"),
+      http_client=httpx.Client(
+        http2=True,
+        timeout=httpx.Timeout(60.0, connect=10.0),
+        limits=httpx.Limits(max_keepalive_connections=64)
+      )
+    )
+
+
+def ask_llm(query, model_name="deepseek", stream=False):
     """
     Query the LLM with a given prompt.
 
     Args:
         query (str): The query to send to the model
-        model_name (str): The model alias (default: deepseek)
+        model_name (str): The model alias or full model name (default: deepseek)
+        stream (bool): If True, write tokens to stdout as they arrive
 
     Returns:
         str: The response from the LLM
     """
-    if model_name not in MODELS:
-        raise ValueError(f"Model '{model_name}' not found. Available models: {', '.join(MODELS.keys())}")
-
-    model = MODELS[model_name]
+    # Unknown names are passed through as full OpenRouter model identifiers
+    model = MODELS.get(model_name, model_name)
 
     # Define text and image parts separately
     text_part = {
@@ -77,7 +57,7 @@ def ask_llm(query, model_name="deepseek"):
       }
       content.append(image_part)
 
-    completion = client.chat.completions.create(
+    completion = _client().chat.completions.create(
       extra_body={},
       model=model,
       messages=[
@@ -85,10 +65,22 @@ def ask_llm(query, model_name="deepseek"):
           "role": "user",
           "content": content
         }
-      ]
+      ],
+      stream=stream
     )
 
-    return completion.choices[0].message.content
+    if not stream:
+      return completion.choices[0].message.content
+
+    chunks = []
+    for chunk in completion:
+      if not chunk.choices:
+        continue
+      delta = chunk.choices[0].delta.content or ""
+      sys.stdout.write(delta)
+      sys.stdout.flush()
+      chunks.append(delta)
+    return "".join(chunks)
 
 
 def main():
@@ -105,8 +97,8 @@ def main():
     )
 
     args = parser.parse_args()
-    response = ask_llm(args.query, args.model)
-    print(response)
+    ask_llm(args.query, args.model, stream=True)
+    print()
 
 
 if __name__ == "__main__":
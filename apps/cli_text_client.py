@@ -1,4 +1,8 @@
 import argparse
+import sys
+
+from openai import OpenAIError
+from openrouter_text_client import OpenRouterClient, ModelConfig
 
 def main():
     """
@@ -88,19 +92,17 @@ def main():
                 print(f"  - {model}")
             return
         
-        response = client.generate_text(
-            user_prompt=args.question,
-            verbose=args.verbose
-        )
+        if args.verbose:
+            print(f"Using model: {client.default_config.model}", file=sys.stderr)
         
         print("\n" + "="*50)
-        print(response)
-        print("="*50)
+        client.generate_text(user_prompt=args.question, stream=True)
+        print("\n" + "="*50)
         
     except ValueError as e:
         print(f"Configuration Error: {e}", file=sys.stderr)
         sys.exit(1)
-    except RuntimeError as e:
+    except OpenAIError as e:
         print(f"API Error: {e}", file=sys.stderr)
         sys.exit(1)
     except KeyboardInterrupt:
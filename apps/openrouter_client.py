@@ -1,6 +1,43 @@
 from openai import OpenAI
+import httpx
 import os
-from typing import List, Dict, Optional, Literal
+from types import MappingProxyType
+from typing import List, Dict, Optional, Literal, Tuple
+
+# Canonical alias -> full model name tables shared by the CLI tools
+TEXT_MODEL_ALIASES = {
+    "deepseek": "deepseek/deepseek-chat-v3.1:free",
+    "deepseek-r1": "deepseek/deepseek-r1:free",
+    "glm": "z-ai/glm-4.5-air:free",
+    "gpt-oss": "openai/gpt-oss-20b:free",
+    "gemma3n": "google/gemma-3n-e4b-it:free",
+    "grok": "x-ai/grok-4-fast:free",
+    "hunyuan": "tencent/hunyuan-a13b-instruct:free",
+    "kimi": "moonshotai/kimi-dev-72b:free",
+    "llama3": "meta-llama/llama-3.3-8b-instruct:free",
+    "minimax": "minimax/minimax-m2:free",
+    "nemotron9b": "nvidia/nemotron-nano-9b-v2:free",
+    "qwen-14b": "qwen/qwen3-14b:free",
+    "qwen-30b": "qwen/qwen3-30b-a3b:free",
+    "qwen-235b": "qwen/qwen3-235b-a22b:free",
+    "sonar": "perplexity/sonar",
+    "sonar-pro": "perplexity/sonar-pro",
+    "sonar-research": "perplexity/sonar-deep-research",
+    "sonar-search": "perplexity/sonar-pro-search",
+    "sonar-reason": "perplexity/sonar-reasoning-pro",
+}
+
+VISION_MODEL_ALIASES = {
+    "llama4": "meta-llama/llama-4-maverick:free",
+    "gemma27b": "google/gemma-3-27b-it:free",
+    "mistral": "mistralai/mistral-small-3.2-24b-instruct:free",
+    "nemotron12b": "nvidia/nemotron-nano-12b-v2-vl:free",
+    "haiku": "anthropic/claude-haiku-4.5",
+    "sonnet": "anthropic/claude-sonnet-4.5",
+}
+
+MODEL_ALIASES = MappingProxyType({**TEXT_MODEL_ALIASES, **VISION_MODEL_ALIASES})
+
 
 class OpenRouterChat:
     """
@@ -8,27 +45,12 @@ class OpenRouterChat:
     Supports both text-only and vision-capable models.
     """
     
-    # Available free text models
-    TEXT_MODELS = [
-        "deepseek/deepseek-chat-v3.1:free",
-        "mistralai/mistral-small-3.2-24b-instruct:free",
-        "moonshotai/kimi-dev-72b:free",
-        "meta-llama/llama-3.3-8b-instruct:free",
-        "nvidia/nemotron-nano-9b-v2:free",
-        "openai/gpt-oss-20b:free",
-        "qwen/qwen3-14b:free",
-        "qwen/qwen3-30b-a3b:free",
-        "qwen/qwen3-235b-a22b:free",
-        "tencent/hunyuan-a13b-instruct:free",
-        "x-ai/grok-4-fast:free",
-        "z-ai/glm-4.5-air:free"
-    ]
+    # Available free text models; the paid models in the alias tables are
+    # only reachable through cli_query
+    TEXT_MODELS = tuple(m for m in TEXT_MODEL_ALIASES.values() if m.endswith(":free"))
     
     # Available free vision models (support image inputs)
-    VISION_MODELS = [
-        # Add vision models here when available
-        # Example: "openai/gpt-4-vision:free"
-    ]
+    VISION_MODELS = tuple(m for m in VISION_MODEL_ALIASES.values() if m.endswith(":free"))
     
     # All available models
     ALL_MODELS = TEXT_MODELS + VISION_MODELS
@@ -44,28 +66,35 @@ class OpenRouterChat:
         if not self.api_key:
             raise ValueError("API key must be provided or set in OPENROUTER_API_KEY environment variable")
         
+        # HTTP/2 lets concurrent requests share one kept-alive connection
+        self._httpx = httpx.Client(
+            http2=True,
+            timeout=httpx.Timeout(60.0, connect=10.0),
+            limits=httpx.Limits(max_keepalive_connections=64)
+        )
         self.client = OpenAI(
             base_url="https://openrouter.ai/api/v1",
-            api_key=self.api_key
+            api_key=self.api_key,
+            http_client=self._httpx
         )
         self.current_model = self.TEXT_MODELS[0]  # Default to first text model
     
-    def list_models(self, model_type: Literal["all", "text", "vision"] = "all") -> List[str]:
+    def list_models(self, model_type: Literal["all", "text", "vision"] = "all") -> Tuple[str, ...]:
         """
-        Get list of available free models.
+        Get the available models.
         
         Args:
             model_type: Filter by model type - "all", "text", or "vision"
         
         Returns:
-            List of model identifiers
+            Tuple of model identifiers (immutable, shared rather than copied)
         """
         if model_type == "text":
-            return self.TEXT_MODELS.copy()
+            return self.TEXT_MODELS
         elif model_type == "vision":
-            return self.VISION_MODELS.copy()
+            return self.VISION_MODELS
         else:
-            return self.ALL_MODELS.copy()
+            return self.ALL_MODELS
     
     def is_vision_model(self, model: str) -> bool:
         """
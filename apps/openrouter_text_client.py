@@ -1,18 +1,326 @@
 import os
 import sys
+import atexit
+import base64
 import json
+import re
 import random
-from dataclasses import dataclass, field
-from typing import Optional, List, Dict, Any, Type, TypeVar
-from openai import OpenAI
-from pydantic import BaseModel, ValidationError
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Optional, List, Dict, Any, ClassVar, FrozenSet, Generator, Iterator, Mapping, Tuple, Type, TypeVar
+import httpx
+from openai import AsyncOpenAI, BadRequestError, OpenAI, OpenAIError
+from pydantic import BaseModel, ValidationError, create_model
+
+try:
+    import tiktoken
+except ImportError:  # optional: token counts fall back to a character estimate
+    tiktoken = None
 
 T = TypeVar('T', bound=BaseModel)
 
-@dataclass
+# Per-request timeout in seconds and SDK retries (exponential backoff with
+# jitter) for 429/5xx, timeout and connection errors
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MAX_RETRIES = 4
+
+# API key read once at import; the constructor re-reads the environment only
+# if it was unset, e.g. when the key is loaded after this module
+_API_KEY = os.environ.get("OPENROUTER_API_KEY")
+
+# Private generator for default model selection and retry jitter
+_RNG = random.Random()
+
+# Upper bound in seconds on the jittered wait between validation retries
+_MAX_BACKOFF = 30.0
+
+# Maximum in-flight requests per client for the async methods
+DEFAULT_MAX_CONCURRENCY = 8
+
+# Token budget for the task text packed into one batch_generate request
+DEFAULT_MAX_PREFILL_TOKENS = 8000
+
+# Output tokens one batch_generate request may reserve for its answers; larger
+# values are rejected by providers with output caps
+_MAX_BATCH_OUTPUT_TOKENS = 8192
+
+# Characters of an invalid response echoed back to the model on retry
+_RETRY_SNIPPET_CHARS = 500
+
+# response_format types tried for structured calls, strongest first
+_RESPONSE_FORMATS = ("json_schema", "json_object", None)
+
+# Terms in a 400 error that identify a rejected response_format
+_RESPONSE_FORMAT_TERMS = ("response_format", "json_schema", "json_object")
+
+# Characters allowed in a json_schema response_format name
+_SCHEMA_NAME_RE = re.compile(r"[^a-zA-Z0-9_-]")
+
+# Context window in tokens of the predefined models; requests to other models
+# are not checked before sending
+_CONTEXT_BY_MODEL: Mapping[str, int] = MappingProxyType({
+    "deepseek/deepseek-chat-v3.1:free": 163840,
+    "mistralai/mistral-small-3.2-24b-instruct:free": 131072,
+    "moonshotai/kimi-dev-72b:free": 131072,
+    "meta-llama/llama-3.3-8b-instruct:free": 128000,
+    "nvidia/nemotron-nano-9b-v2:free": 128000,
+    "openai/gpt-oss-20b:free": 131072,
+    "qwen/qwen3-14b:free": 40960,
+    "qwen/qwen3-30b-a3b:free": 40960,
+    "qwen/qwen3-235b-a22b:free": 40960,
+    "tencent/hunyuan-a13b-instruct:free": 32768,
+    "x-ai/grok-4-fast:free": 2000000,
+    "z-ai/glm-4.5-air:free": 131072,
+})
+
+# Output tokens reserved in the context check when a request sets no max_tokens
+_DEFAULT_OUTPUT_RESERVE = 1024
+
+# Per-message token overhead of the chat format
+_TOKENS_PER_MESSAGE = 4
+
+# Sent when downloading images; some hosts (e.g. Wikimedia) reject generic agents
+_USER_AGENT = "ORouter/0.1 (https://github.com/csv610/ORouter)"
+
+# A draft model is skipped for a schema once it has been tried this many times
+# and fewer than this share of its responses validated
+_DRAFT_MIN_ATTEMPTS = 5
+_DRAFT_MIN_SUCCESS_RATE = 0.6
+
+# Draft outcomes per (draft model, response model): [successes, attempts]
+_DRAFT_STATS: Dict[Tuple[str, Type[BaseModel]], List[int]] = {}
+
+# Shared read-only default for ModelConfig.extra_body
+_NO_EXTRA_BODY: Mapping[str, Any] = MappingProxyType({})
+
+# Optional ```json fence around a response; the closing fence may be missing
+_FENCE_RE = re.compile(r"^```[^\n]*\n(.*?)(?:\n```)?$", re.DOTALL)
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter for the given zero-based attempt."""
+    return _RNG.uniform(0, min(_MAX_BACKOFF, 2 ** attempt))
+
+
+@lru_cache(maxsize=1)
+def _encoding() -> Optional[Any]:
+    """The cl100k_base tiktoken encoding, or None if it is unavailable."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # The encoding file is downloaded on first use and may be unreachable
+        return None
+
+
+@lru_cache(maxsize=512)
+def _estimate_tokens(text: str) -> int:
+    """
+    Token count for budgeting.
+    
+    Uses tiktoken's cl100k_base when installed. OpenRouter models use a variety
+    of tokenizers, so this is an estimate either way; without tiktoken it
+    assumes ~4 characters per token.
+    """
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _message_text(content: Any) -> str:
+    """Text of a message's content, joining the text parts of multimodal content."""
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") for part in content)
+
+
+def _count_message_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Estimated prompt tokens of a chat messages list, excluding images."""
+    return sum(
+        _estimate_tokens(_message_text(m["content"])) + _TOKENS_PER_MESSAGE for m in messages
+    )
+
+
+def _draft_enabled(draft_model: str, response_model: Type[BaseModel]) -> bool:
+    """Whether a draft model still validates often enough for this schema."""
+    successes, attempts = _DRAFT_STATS.get((draft_model, response_model), (0, 0))
+    return attempts < _DRAFT_MIN_ATTEMPTS or successes >= _DRAFT_MIN_SUCCESS_RATE * attempts
+
+
+def _record_draft(draft_model: str, response_model: Type[BaseModel], success: bool) -> None:
+    """Record whether a draft model's response validated."""
+    stats = _DRAFT_STATS.setdefault((draft_model, response_model), [0, 0])
+    stats[0] += success
+    stats[1] += 1
+
+
+@lru_cache(maxsize=64)
+def _estimate_max_tokens(response_model: Type[BaseModel]) -> int:
+    """
+    Rough upper bound on the output tokens of one response_model instance.
+    
+    Used as max_tokens for structured calls so a model cannot keep generating
+    past the end of the JSON.
+    """
+    return len(json.dumps(_json_schema(response_model))) // 2 + 256
+
+
+@lru_cache(maxsize=1)
+def _shared_http_client() -> httpx.Client:
+    """
+    HTTP/2 connection pool shared by every OpenRouterClient in the process.
+    
+    Created on first use and closed at interpreter exit, so new client
+    instances reuse warm connections instead of repeating the TLS handshake.
+    """
+    client = httpx.Client(
+        http2=True,
+        timeout=DEFAULT_TIMEOUT,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    )
+    atexit.register(client.close)
+    return client
+
+
+@lru_cache(maxsize=16)
+def _inline_image(url: str) -> str:
+    """
+    Download an image once and return it as a base64 data URL.
+    
+    Sending the image inline spares the provider a fetch of the URL before
+    prefill. Entries hold the full image, hence the small cache.
+    """
+    response = _shared_http_client().get(
+        url,
+        timeout=10.0,
+        follow_redirects=True,
+        headers={"User-Agent": _USER_AGENT},
+    )
+    response.raise_for_status()
+    content_type = response.headers.get("content-type", "image/jpeg").split(";")[0].strip()
+    return f"data:{content_type};base64,{base64.b64encode(response.content).decode('ascii')}"
+
+
+@lru_cache(maxsize=128)
+def _list_wrapper(item_model: Type[BaseModel]) -> Type[BaseModel]:
+    """
+    Build the {"items": [...]} wrapper model for an item model once per class.
+    
+    Reusing the class keeps its compiled validator and its cached schema
+    instruction across calls.
+    """
+    return create_model("ListWrapper", items=(List[item_model], ...))
+
+
+@lru_cache(maxsize=64)
+def _json_schema(response_model: Type[BaseModel]) -> Dict[str, Any]:
+    """
+    Build the JSON schema for a Pydantic model once per model class.
+    
+    The returned dict is shared between callers and must not be mutated.
+    """
+    return response_model.model_json_schema()
+
+
+def _count_refs(node: Any, counts: Dict[str, int]) -> None:
+    """Count how often each $defs entry is referenced within a schema node."""
+    if isinstance(node, dict):
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith("#/$defs/"):
+            name = ref[len("#/$defs/"):]
+            counts[name] = counts.get(name, 0) + 1
+        for value in node.values():
+            _count_refs(value, counts)
+    elif isinstance(node, list):
+        for item in node:
+            _count_refs(item, counts)
+
+
+def _compact_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Shrink a Pydantic JSON schema before it is embedded in a prompt.
+    
+    Drops the auto-generated "title" keys and inlines $defs entries that are
+    referenced exactly once and reference nothing themselves. Field
+    descriptions are kept because they carry instructions for the model.
+    
+    Args:
+        schema: JSON schema as produced by model_json_schema()
+        
+    Returns:
+        A new, smaller schema; the input is not modified
+    """
+    defs = schema.get("$defs", {})
+    counts: Dict[str, int] = {}
+    _count_refs(schema, counts)
+    inlinable = set()
+    for name, definition in defs.items():
+        nested: Dict[str, int] = {}
+        _count_refs(definition, nested)
+        if counts.get(name) == 1 and not nested:
+            inlinable.add(name)
+    
+    def walk(node: Any, is_properties: bool = False) -> Any:
+        if isinstance(node, list):
+            return [walk(item) for item in node]
+        if not isinstance(node, dict):
+            return node
+        
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref[len("#/$defs/"):] in inlinable:
+            siblings = {key: value for key, value in node.items() if key != "$ref"}
+            return walk({**defs[ref[len("#/$defs/"):]], **siblings})
+        
+        compact = {}
+        for key, value in node.items():
+            if is_properties:
+                # Keys here are field names, not schema keywords
+                compact[key] = walk(value)
+            elif key == "title":
+                continue
+            elif key in ("default", "examples", "enum", "const"):
+                compact[key] = value
+            elif key == "$defs":
+                kept = {name: walk(d) for name, d in value.items() if name not in inlinable}
+                if kept:
+                    compact[key] = kept
+            else:
+                compact[key] = walk(value, is_properties=(key == "properties"))
+        return compact
+    
+    return walk(schema)
+
+
+@lru_cache(maxsize=256)
+def _schema_instruction(response_model: Type[BaseModel], base_system_prompt: str) -> str:
+    """
+    Build the system message asking for JSON matching response_model.
+    
+    Cached per (model class, base system prompt), so repeated structured calls
+    reuse the serialized schema instead of re-dumping it every time.
+    """
+    schema_instruction = (
+        f"You must respond with valid JSON that matches this exact schema:\n"
+        f"{json.dumps(_compact_schema(_json_schema(response_model)), separators=(',', ':'), ensure_ascii=False)}\n\n"
+        f"Respond ONLY with the JSON object, no additional text or markdown formatting."
+    )
+    return f"{base_system_prompt}\n\n{schema_instruction}".strip()
+
+
+@dataclass(frozen=True)
 class ModelConfig:
     """
     Configuration for model inference parameters.
+    
+    Instances are immutable; use dataclasses.replace() to derive a variant.
     """
     model: Optional[str] = None
     temperature: float = 0.7
@@ -21,10 +329,13 @@ class ModelConfig:
     frequency_penalty: float = 0.0
     presence_penalty: float = 0.0
     system_prompt: Optional[str] = None
-    extra_body: Dict[str, Any] = field(default_factory=dict)
+    extra_body: Mapping[str, Any] = field(default_factory=lambda: _NO_EXTRA_BODY)
+    # Cheaper model given the first attempt at structured calls (alias or full name)
+    draft_model: Optional[str] = None
+    _api_params: Dict[str, Any] = field(init=False, repr=False, compare=False)
     
     def __post_init__(self):
-        """Validate configuration parameters."""
+        """Validate configuration parameters and precompute the API parameters."""
         if self.temperature < 0 or self.temperature > 2:
             raise ValueError("Temperature must be between 0 and 2")
         if self.top_p < 0 or self.top_p > 1:
@@ -35,26 +346,100 @@ class ModelConfig:
             raise ValueError("presence_penalty must be between -2 and 2")
         if self.max_tokens is not None and self.max_tokens < 1:
             raise ValueError("max_tokens must be positive")
-    
-    def to_api_params(self) -> Dict[str, Any]:
-        """
-        Convert config to API parameters dictionary.
         
-        Returns:
-            Dictionary of API parameters with non-None values.
-        """
         params = {
             "temperature": self.temperature,
             "top_p": self.top_p,
             "frequency_penalty": self.frequency_penalty,
             "presence_penalty": self.presence_penalty,
-            "extra_body": self.extra_body,
+            "extra_body": dict(self.extra_body),
         }
         
         if self.max_tokens is not None:
             params["max_tokens"] = self.max_tokens
+        
+        # The config is frozen, so the parameters are built once per instance
+        object.__setattr__(self, "_api_params", params)
+    
+    def to_api_params(self) -> Dict[str, Any]:
+        """
+        Convert config to API parameters dictionary.
+        
+        Returns:
+            A shallow copy of the API parameters with non-None values; callers
+            may add or remove keys but must not mutate extra_body.
+        """
+        return self._api_params.copy()
+
+
+class ResponseCache:
+    """
+    SQLite-backed cache of completion results keyed by a hash of the request.
+    
+    Identical requests (same model, messages and sampling parameters) are
+    answered from the cache without calling the API.
+    """
+    
+    def __init__(self, path: str = ".openrouter_cache.sqlite", ttl: Optional[float] = None):
+        """
+        Open (or create) the cache database.
+        
+        Args:
+            path: SQLite database file
+            ttl: Seconds after which an entry is treated as expired (None keeps entries forever)
+        """
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.commit()
+    
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> str:
+        """
+        Hash a request into a cache key.
+        
+        Args:
+            model: Full model name
+            messages: Messages sent to the model
+            params: Sampling and extra request parameters
             
-        return params
+        Returns:
+            Hex digest identifying the request
+        """
+        payload = json.dumps([model, messages, params], sort_keys=True, default=str)
+        return hashlib.blake2b(payload.encode(), digest_size=32).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up a cached value.
+        
+        Returns:
+            The cached value, or None if missing or expired
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        
+        if row is None:
+            return None
+        value, created = row
+        if self.ttl is not None and time.time() - created > self.ttl:
+            return None
+        return value
+    
+    def put(self, key: str, value: str) -> None:
+        """Store a value, replacing any previous entry for the key."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created) VALUES (?, ?, ?)",
+                (key, value, time.time())
+            )
+            self._conn.commit()
 
 
 class OpenRouterClient:
@@ -62,7 +447,7 @@ class OpenRouterClient:
     A client for interacting with the OpenRouter API with support for
     both text generation and structured output.
     """
-    MODELS = [
+    MODELS: ClassVar[List[str]] = [
         "deepseek/deepseek-chat-v3.1:free",
         "mistralai/mistral-small-3.2-24b-instruct:free",
         "moonshotai/kimi-dev-72b:free",
@@ -77,7 +462,12 @@ class OpenRouterClient:
         "z-ai/glm-4.5-air:free",
     ]
     
-    MODEL_ALIASES = {
+    # O(1) membership checks; MODELS keeps the display order
+    _MODELS_SET: ClassVar[FrozenSet[str]] = frozenset(MODELS)
+    
+    DEFAULT_VISION_MODEL: ClassVar[str] = "qwen/qwen2.5-vl-32b-instruct:free"
+    
+    MODEL_ALIASES: ClassVar[Dict[str, str]] = {
         "deepseek": "deepseek/deepseek-chat-v3.1:free",
         "mistral": "mistralai/mistral-small-3.2-24b-instruct:free",
         "kimi": "moonshotai/kimi-dev-72b:free",
@@ -91,34 +481,73 @@ class OpenRouterClient:
         "grok": "x-ai/grok-4-fast:free",
         "glm": "z-ai/glm-4.5-air:free",
     }
+    
+    # Weakest response_format each model has accepted, shared by all instances;
+    # models not listed here are tried with json_schema first
+    _response_format_kinds: ClassVar[Dict[str, Optional[str]]] = {}
+    
+    # max_tokens sent for structured calls per (model, response_model), shared by
+    # all instances; None once a response was cut off at the schema estimate.
+    # Pairs not listed here are capped at _estimate_max_tokens
+    _output_caps: ClassVar[Dict[Tuple[str, Type[BaseModel]], Optional[int]]] = {}
 
-    def __init__(self, config: Optional[ModelConfig] = None):
+    def __init__(
+        self,
+        config: Optional[ModelConfig] = None,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        cache: Optional[ResponseCache] = None
+    ):
         """
         Initialize the OpenRouter client.
         
         Args:
             api_key: Optional API key. If not provided, reads from OPENROUTER_API_KEY env variable.
             config: Default ModelConfig to use for all requests.
+            timeout: Per-request timeout in seconds (default: 60)
+            max_retries: Retries with exponential backoff on rate limits, 5xx,
+                timeouts and connection errors (default: 4)
+            max_concurrency: Maximum concurrent requests issued by the async
+                methods (default: 8)
+            cache: Optional ResponseCache answering repeated requests without an API call
         """
-        api_key = os.getenv("OPENROUTER_API_KEY")
+        api_key = _API_KEY or os.environ.get("OPENROUTER_API_KEY")
         if not api_key:
             raise ValueError(
                 "API key not found. Set OPENROUTER_API_KEY environment variable "
                 "or pass it to the constructor."
             )
         
+        self._client_options = {
+            "base_url": "https://openrouter.ai/api/v1",
+            "api_key": api_key,
+            "timeout": timeout,
+            "max_retries": max_retries,
+        }
+        
+        # One keep-alive pool per client, reused across requests and models
         self.client = OpenAI(
-            base_url="https://openrouter.ai/api/v1",
-            api_key=api_key
+            **self._client_options,
+            http_client=_shared_http_client()
         )
+        # Semaphore and async client per event loop; asyncio objects cannot be
+        # shared between loops, e.g. across separate asyncio.run() calls
+        self._max_concurrency = max_concurrency
+        self._async_resources: Dict[
+            asyncio.AbstractEventLoop, Tuple[asyncio.Semaphore, AsyncOpenAI]
+        ] = {}
+        self.cache = cache
         self.default_config = config or ModelConfig()
         
         # Select and validate model
         if self.default_config.model is None:
-            self.default_config.model = random.choice(self.get_models())
+            self.default_config = replace(self.default_config, model=_RNG.choice(self.MODELS))
         else:
-            self.default_config.model = self.resolve_model(self.default_config.model)
-            if self.default_config.model not in self.MODELS:
+            self.default_config = replace(
+                self.default_config, model=self.resolve_model(self.default_config.model)
+            )
+            if self.default_config.model not in self._MODELS_SET:
                 print(
                     f"Warning: '{self.default_config.model}' not in predefined list. Attempting anyway...",
                     file=sys.stderr
@@ -142,65 +571,720 @@ class OpenRouterClient:
         Returns the list of available models.
         
         Returns:
-            List of model identifiers
+            List of model identifiers, shared with the class; do not modify
         """
         return self.MODELS
 
-    def generate_text(self, user_prompt: str) -> str:
+    def _loop_resources(self) -> Tuple[asyncio.Semaphore, AsyncOpenAI]:
         """
-        Gets a completion from the OpenRouter API using the default config.
+        The concurrency semaphore and async client of the running event loop,
+        created on first use in that loop.
+        """
+        loop = asyncio.get_running_loop()
+        resources = self._async_resources.get(loop)
+        if resources is None:
+            # Entries of finished loops (e.g. earlier asyncio.run() calls) are dead
+            for closed in [other for other in self._async_resources if other.is_closed()]:
+                del self._async_resources[closed]
+            async_client = AsyncOpenAI(
+                **self._client_options,
+                http_client=httpx.AsyncClient(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+                )
+            )
+            resources = (asyncio.Semaphore(self._max_concurrency), async_client)
+            self._async_resources[loop] = resources
+        return resources
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """
+        Async OpenAI client used by the agenerate_* methods in the running event loop.
+        
+        Each event loop gets its own client, since asyncio connections cannot be
+        shared between loops; that is also why it is not shared between instances
+        the way the sync connection pool is. Must be accessed from a coroutine.
+        """
+        return self._loop_resources()[1]
+
+    async def aclose(self) -> None:
+        """
+        Close the async client of the running event loop, if one was created.
+        
+        Call before the loop ends, e.g. at the end of the coroutine passed to
+        asyncio.run(); a later async call in the same loop opens a new client.
+        """
+        resources = self._async_resources.pop(asyncio.get_running_loop(), None)
+        if resources is not None:
+            await resources[1].close()
+
+    def _call_config(
+        self,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> ModelConfig:
+        """
+        Apply per-call overrides on top of the default config.
         
         Args:
-            user_prompt: The user's message/prompt
+            model: Optional model alias or full name overriding the default model
+            temperature: Optional temperature overriding the default temperature
+            max_tokens: Optional output token limit overriding the default limit
             
         Returns:
-            The generated text response
-            
+            The default config, or a validated copy with the overrides applied
+        """
+        overrides: Dict[str, Any] = {}
+        if model is not None:
+            overrides["model"] = self.resolve_model(model)
+        if temperature is not None:
+            overrides["temperature"] = temperature
+        if max_tokens is not None:
+            overrides["max_tokens"] = max_tokens
+        
+        if not overrides:
+            return self.default_config
+        return replace(self.default_config, **overrides)
+
+    @staticmethod
+    def _check_context(request: Dict[str, Any]) -> None:
+        """
+        Reject a request whose prompt cannot fit in the model's context window.
+        
         Raises:
-            RuntimeError: If the API request fails
+            ValueError: If the prompt plus the reserved output tokens exceed the
+                context window of a predefined model
         """
-        config = self.default_config
+        context = _CONTEXT_BY_MODEL.get(request["model"])
+        if context is None:
+            return
+        prompt_tokens = _count_message_tokens(request["messages"])
+        reserve = request.get("max_tokens") or _DEFAULT_OUTPUT_RESERVE
+        if prompt_tokens + reserve > context:
+            raise ValueError(
+                f"Prompt is ~{prompt_tokens} tokens; with {reserve} output tokens it "
+                f"exceeds the {context}-token context of {request['model']}"
+            )
+
+    def _create(self, **request: Any) -> Any:
+        """Send a chat completion request with the sync client."""
+        self._check_context(request)
+        return self.client.chat.completions.create(**request)
+
+    async def _acreate(self, **request: Any) -> Any:
+        """Send a chat completion request with the async client, bounded by max_concurrency."""
+        self._check_context(request)
+        semaphore, async_client = self._loop_resources()
+        async with semaphore:
+            return await async_client.chat.completions.create(**request)
+
+    def _response_format(
+        self,
+        model: str,
+        response_model: Type[BaseModel]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        response_format constraining a structured call, or None if the model
+        accepts neither JSON mode.
+        
+        Schema mode is sent with strict=False because Pydantic schemas do not
+        meet OpenAI's strict-mode rules (every property required, no extra
+        keys), which providers enforce by rejecting the request.
+        """
+        kind = self._response_format_kinds.get(model, _RESPONSE_FORMATS[0])
+        if kind == "json_schema":
+            return {
+                "type": "json_schema",
+                "json_schema": {
+                    "name": _SCHEMA_NAME_RE.sub("_", response_model.__name__)[:64],
+                    "schema": _json_schema(response_model),
+                    "strict": False,
+                },
+            }
+        if kind == "json_object":
+            return {"type": "json_object"}
+        return None
+
+    def _downgrade_response_format(self, model: str) -> None:
+        """Fall back to the next weaker response_format for a model."""
+        kind = self._response_format_kinds.get(model, _RESPONSE_FORMATS[0])
+        index = _RESPONSE_FORMATS.index(kind)
+        if index + 1 < len(_RESPONSE_FORMATS):
+            self._response_format_kinds[model] = _RESPONSE_FORMATS[index + 1]
+
+    @staticmethod
+    def _rejects_response_format(
+        error: BadRequestError,
+        response_format: Optional[Dict[str, Any]]
+    ) -> bool:
+        """
+        Whether a 400 was caused by the response_format that was sent.
+        
+        Other bad requests (an oversized max_tokens, context overflow, an unknown
+        model id) must not switch JSON mode off for the model.
+        """
+        if response_format is None:
+            return False
+        details = f"{error.param or ''} {error.message} {error.body or ''}".lower()
+        return any(term in details for term in _RESPONSE_FORMAT_TERMS)
+
+    def _send_structured(
+        self,
+        response_model: Type[BaseModel],
+        request: Dict[str, Any]
+    ) -> Generator[Tuple[str, Any], Any, Any]:
+        """
+        Send a structured request with the strongest response_format the model
+        accepts, downgrading once per rejected format and model. Bad requests
+        unrelated to response_format are raised immediately.
+        """
+        while True:
+            response_format = self._response_format(request["model"], response_model)
+            if response_format is not None:
+                request["response_format"] = response_format
+            else:
+                request.pop("response_format", None)
+            try:
+                return (yield ("send", request))
+            except BadRequestError as e:
+                if not self._rejects_response_format(e, response_format):
+                    raise
+                self._downgrade_response_format(request["model"])
+
+    def _draft_for(self, config: ModelConfig, response_model: Type[BaseModel]) -> Optional[str]:
+        """The draft model to try first for a structured call, if any."""
+        if config.draft_model is None:
+            return None
+        draft = self.resolve_model(config.draft_model)
+        if draft == config.model or not _draft_enabled(draft, response_model):
+            return None
+        return draft
+
+    def _cache_key(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        api_params: Dict[str, Any]
+    ) -> Optional[str]:
+        """Cache key for a request, or None when caching is disabled."""
+        if self.cache is None:
+            return None
+        return self.cache.make_key(model, messages, api_params)
+
+    def _cache_get(self, key: Optional[str]) -> Optional[str]:
+        """Return the cached value for key, if any."""
+        if key is None:
+            return None
+        return self.cache.get(key)
+
+    def _cache_put(self, key: Optional[str], value: Optional[str]) -> None:
+        """
+        Store value under key when caching is enabled.
         
+        Empty completions (content None, e.g. refusals) are not cached.
+        """
+        if key is not None and value is not None:
+            self.cache.put(key, value)
+
+    def _structured_params(
+        self,
+        config: ModelConfig,
+        model: str,
+        response_model: Type[BaseModel],
+        temperature: Optional[float]
+    ) -> Dict[str, Any]:
+        """
+        API parameters for a structured call to model.
+        
+        Structured calls run at temperature 0 unless a temperature is passed for
+        the call, and are capped at an output size estimated from the schema
+        unless the config sets max_tokens or the model has outgrown the estimate.
+        """
+        api_params = config.to_api_params()
+        if temperature is None:
+            api_params["temperature"] = 0.0
+        if config.max_tokens is None:
+            cap = self._output_caps.get(
+                (model, response_model), _estimate_max_tokens(response_model)
+            )
+            if cap is not None:
+                api_params["max_tokens"] = cap
+        return api_params
+
+    def _lift_if_truncated(
+        self,
+        config: ModelConfig,
+        model: str,
+        response_model: Type[BaseModel],
+        completion: Any
+    ) -> bool:
+        """
+        Stop capping max_tokens for model and response_model if completion was
+        cut off at the schema-based estimate.
+        
+        Reasoning models spend part of their output on thinking, so a response
+        that outgrew the estimate once will keep doing so; the lift is kept for
+        later calls instead of costing each of them a truncated attempt.
+        
+        Returns:
+            True if the cap was lifted
+        """
+        if config.max_tokens is not None or completion.choices[0].finish_reason != "length":
+            return False
+        self._output_caps[(model, response_model)] = None
+        return True
+
+    @staticmethod
+    def _text_messages(config: ModelConfig, user_prompt: str) -> List[Dict[str, str]]:
+        """Build the message list for a plain text request."""
         messages = []
         if config.system_prompt:
             messages.append({"role": "system", "content": config.system_prompt})
         messages.append({"role": "user", "content": user_prompt})
+        return messages
+
+    @staticmethod
+    def _vision_messages(config: ModelConfig, prompt: str, image_url: str) -> List[Dict[str, Any]]:
+        """Build the message list for a question about an image."""
+        messages: List[Dict[str, Any]] = []
+        if config.system_prompt:
+            messages.append({"role": "system", "content": config.system_prompt})
+        messages.append({
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt},
+                {"type": "image_url", "image_url": {"url": image_url}},
+            ],
+        })
+        return messages
+
+    @staticmethod
+    def _structured_messages(
+        config: ModelConfig,
+        user_prompt: str,
+        response_model: Type[BaseModel]
+    ) -> List[Dict[str, str]]:
+        """Build the message list asking for JSON that matches response_model."""
+        enhanced_system_prompt = _schema_instruction(response_model, config.system_prompt or "")
+        
+        return [
+            {"role": "system", "content": enhanced_system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+
+    @classmethod
+    def _parse_structured(cls, response_text: Optional[str], response_model: Type[T]) -> T:
+        """Extract the JSON payload from a response and validate it against response_model."""
+        # Refusals and truncated reasoning can return no content; validating ""
+        # turns that into a ValidationError the retry loop handles
+        json_text = cls._extract_json(response_text or "")
+        
+        # Parse and validate in one pass; malformed JSON surfaces as a ValidationError
+        return response_model.model_validate_json(json_text)
+
+    @staticmethod
+    def _retry_messages(
+        messages: List[Dict[str, str]],
+        response_text: Optional[str],
+        error: Exception
+    ) -> List[Dict[str, str]]:
+        """
+        Build the messages for a retry attempt from the original system and user messages.
         
-        try:
-            api_params = config.to_api_params()
-            completion = self.client.chat.completions.create(
-                model=config.model,
-                messages=messages,
-                **api_params
+        Instead of replaying the whole conversation, the user message is extended
+        with a truncated copy of the invalid output and a short error summary, so
+        retries send roughly the same number of tokens as the first attempt.
+        """
+        system_message, user_message = messages
+        
+        if isinstance(error, ValidationError):
+            error_summary = "; ".join(
+                f"{'.'.join(str(part) for part in err['loc']) or 'root'}: {err['msg']}"
+                for err in error.errors()[:10]
             )
-            return completion.choices[0].message.content
-        except Exception as e:
-            raise RuntimeError(f"API request failed: {str(e)}")
+        else:
+            error_summary = str(error)
+        
+        feedback = (
+            f"\n\nYour previous response was invalid.\n"
+            f"Previous output (truncated): {(response_text or '')[:_RETRY_SNIPPET_CHARS]}\n"
+            f"Error: {error_summary}\n"
+            f"Please provide a valid JSON response matching the schema exactly."
+        )
+        return [
+            system_message,
+            {"role": "user", "content": user_message["content"] + feedback}
+        ]
+
+    def generate_text(
+        self,
+        user_prompt: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        stream: bool = False
+    ) -> str:
+        """
+        Gets a completion from the OpenRouter API using the default config.
+        
+        Args:
+            user_prompt: The user's message/prompt
+            model: Optional model overriding the default config for this call
+            temperature: Optional temperature overriding the default config for this call
+            stream: If True, write tokens to stdout as they arrive (default: False)
+            
+        Returns:
+            The generated text response
+            
+        Raises:
+            ValueError: If the prompt does not fit in the model's context window
+            openai.OpenAIError: If the API request fails after the SDK's retries
+        """
+        if stream:
+            return self.stream_to_stdout(user_prompt, model=model, temperature=temperature)
+        
+        config = self._call_config(model=model, temperature=temperature)
+        messages = self._text_messages(config, user_prompt)
+        api_params = config.to_api_params()
+        
+        cache_key = self._cache_key(config.model, messages, api_params)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
+        completion = self._create(
+            model=config.model,
+            messages=messages,
+            **api_params
+        )
+        response_text = completion.choices[0].message.content
+        self._cache_put(cache_key, response_text)
+        return response_text
+    
+    def stream_text(
+        self,
+        user_prompt: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None
+    ) -> Iterator[str]:
+        """
+        Stream a completion, yielding text chunks as they arrive.
+        
+        Args:
+            user_prompt: The user's message/prompt
+            model: Optional model overriding the default config for this call
+            temperature: Optional temperature overriding the default config for this call
+            
+        Yields:
+            Text deltas in generation order
+            
+        Raises:
+            ValueError: If the prompt does not fit in the model's context window
+            openai.OpenAIError: If the API request fails after the SDK's retries
+        """
+        config = self._call_config(model=model, temperature=temperature)
+        messages = self._text_messages(config, user_prompt)
+        
+        completion = self._create(
+            model=config.model,
+            messages=messages,
+            stream=True,
+            **config.to_api_params()
+        )
+        for chunk in completion:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
+    def stream_to_stdout(
+        self,
+        user_prompt: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None
+    ) -> str:
+        """
+        Stream a completion to stdout as it is generated.
+        
+        Args:
+            user_prompt: The user's message/prompt
+            model: Optional model overriding the default config for this call
+            temperature: Optional temperature overriding the default config for this call
+            
+        Returns:
+            The full generated text
+        """
+        chunks = []
+        for chunk in self.stream_text(user_prompt, model=model, temperature=temperature):
+            sys.stdout.write(chunk)
+            sys.stdout.flush()
+            chunks.append(chunk)
+        return "".join(chunks)
+    
+    async def agenerate_text(
+        self,
+        user_prompt: str,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None
+    ) -> str:
+        """
+        Async version of generate_text using the async client.
+        
+        Args:
+            user_prompt: The user's message/prompt
+            model: Optional model overriding the default config for this call
+            temperature: Optional temperature overriding the default config for this call
+            
+        Returns:
+            The generated text response
+            
+        Raises:
+            ValueError: If the prompt does not fit in the model's context window
+            openai.OpenAIError: If the API request fails after the SDK's retries
+        """
+        config = self._call_config(model=model, temperature=temperature)
+        messages = self._text_messages(config, user_prompt)
+        api_params = config.to_api_params()
+        
+        cache_key = self._cache_key(config.model, messages, api_params)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
+        completion = await self._acreate(
+            model=config.model,
+            messages=messages,
+            **api_params
+        )
+        response_text = completion.choices[0].message.content
+        self._cache_put(cache_key, response_text)
+        return response_text
+    
+    async def generate_many(self, prompts: List[str]) -> List[str]:
+        """
+        Generate text for several prompts concurrently.
+        
+        At most max_concurrency requests are in flight at any time.
+        
+        Args:
+            prompts: User prompts to send
+            
+        Returns:
+            Responses in the same order as prompts
+        """
+        return list(await asyncio.gather(*(self.agenerate_text(p) for p in prompts)))
+    
+    def generate_vision(
+        self,
+        prompt: str,
+        image_url: str,
+        model: str = DEFAULT_VISION_MODEL,
+        temperature: Optional[float] = None,
+        inline_image: bool = False
+    ) -> str:
+        """
+        Ask a vision model a question about an image.
+        
+        Args:
+            prompt: The question or instruction about the image
+            image_url: URL of the image, or a base64 data URL
+            model: Vision-capable model (default: qwen/qwen2.5-vl-32b-instruct:free)
+            temperature: Optional temperature overriding the default config for this call
+            inline_image: If True, download the image (once per URL) and send it as
+                a base64 data URL instead of having the provider fetch it
+            
+        Returns:
+            The generated text response
+            
+        Raises:
+            httpx.HTTPError: If inline_image is set and the image cannot be downloaded
+            openai.OpenAIError: If the API request fails after the SDK's retries
+            
+        Example:
+            >>> client = OpenRouterClient()
+            >>> print(client.generate_vision(
+            ...     "What is in this image?",
+            ...     "https://upload.wikimedia.org/example.jpg"
+            ... ))
+        """
+        if inline_image and not image_url.startswith("data:"):
+            image_url = _inline_image(image_url)
+        
+        config = self._call_config(model=model, temperature=temperature)
+        messages = self._vision_messages(config, prompt, image_url)
+        api_params = config.to_api_params()
+        
+        cache_key = self._cache_key(config.model, messages, api_params)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
+        completion = self._create(
+            model=config.model,
+            messages=messages,
+            **api_params
+        )
+        response_text = completion.choices[0].message.content
+        self._cache_put(cache_key, response_text)
+        return response_text
+    
+    def _structured_steps(
+        self,
+        user_prompt: str,
+        response_model: Type[T],
+        max_retries: int,
+        model: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int]
+    ) -> Generator[Tuple[str, Any], Any, T]:
+        """
+        The steps of a structured call, shared by generate_structured and
+        agenerate_structured.
+        
+        Yields ("send", request) for each chat completion request and receives
+        the completion, or has the request's exception thrown in; yields
+        ("sleep", seconds) for each wait between retries. Returns the validated
+        response.
+        """
+        if max_retries < 1:
+            raise ValueError("max_retries must be at least 1")
+        
+        config = self._call_config(model=model, temperature=temperature, max_tokens=max_tokens)
+        base_messages = messages = self._structured_messages(config, user_prompt, response_model)
+        
+        last_error: Optional[ValidationError] = None
+        response_text = None
+        api_params = self._structured_params(config, config.model, response_model, temperature)
+        
+        # Cached entries hold the validated model as JSON
+        cache_key = self._cache_key(config.model, messages, api_params)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return response_model.model_validate_json(cached)
+        
+        # A cheaper draft model gets the first try; the configured model only
+        # runs if the draft's answer does not validate
+        draft = self._draft_for(config, response_model)
+        if draft is not None:
+            draft_params = self._structured_params(config, draft, response_model, temperature)
+            completion = None
+            try:
+                completion = yield from self._send_structured(
+                    response_model, {"model": draft, "messages": messages, **draft_params}
+                )
+                drafted = self._parse_structured(
+                    completion.choices[0].message.content, response_model
+                )
+            except (ValueError, OpenAIError):
+                # ValidationError and the context check both raise ValueError
+                _record_draft(draft, response_model, False)
+                if completion is not None:
+                    self._lift_if_truncated(config, draft, response_model, completion)
+            else:
+                _record_draft(draft, response_model, True)
+                self._cache_put(cache_key, drafted.model_dump_json())
+                return drafted
+        
+        for attempt in range(max_retries):
+            try:
+                completion = yield from self._send_structured(
+                    response_model, {"model": config.model, "messages": messages, **api_params}
+                )
+                response_text = completion.choices[0].message.content
+                validated_response = self._parse_structured(response_text, response_model)
+                self._cache_put(cache_key, validated_response.model_dump_json())
+                return validated_response
+                
+            except ValidationError as e:
+                last_error = e
+                if self._lift_if_truncated(config, config.model, response_model, completion):
+                    # The schema-based estimate was too tight; lift it for the retries
+                    api_params.pop("max_tokens", None)
+                if attempt < max_retries - 1:
+                    # Resend the original request with error feedback attached
+                    messages = self._retry_messages(base_messages, response_text, e)
+                    yield ("sleep", _backoff_delay(attempt))
+        
+        # If we get here, all retries failed
+        assert last_error is not None
+        raise last_error
+    
+    def _run_steps(self, steps: Generator[Tuple[str, Any], Any, T]) -> T:
+        """Run the steps of a structured call with the sync client."""
+        reply: Any = None
+        error: Optional[Exception] = None
+        while True:
+            try:
+                step, arg = steps.throw(error) if error is not None else steps.send(reply)
+            except StopIteration as stop:
+                return stop.value
+            reply, error = None, None
+            if step == "sleep":
+                time.sleep(arg)
+                continue
+            try:
+                reply = self._create(**arg)
+            except Exception as e:
+                error = e
+    
+    async def _arun_steps(self, steps: Generator[Tuple[str, Any], Any, T]) -> T:
+        """Async version of _run_steps."""
+        reply: Any = None
+        error: Optional[Exception] = None
+        while True:
+            try:
+                step, arg = steps.throw(error) if error is not None else steps.send(reply)
+            except StopIteration as stop:
+                return stop.value
+            reply, error = None, None
+            if step == "sleep":
+                await asyncio.sleep(arg)
+                continue
+            try:
+                reply = await self._acreate(**arg)
+            except Exception as e:
+                error = e
     
     def generate_structured(
         self, 
         user_prompt: str, 
         response_model: Type[T],
-        max_retries: int = 3
+        max_retries: int = 3,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
     ) -> T:
         """
         Generate structured output using a Pydantic model schema.
         
         This method instructs the LLM to respond with JSON matching the provided
-        Pydantic model schema. It includes retry logic to handle validation failures,
-        providing error feedback to the model for self-correction.
+        Pydantic model schema, and requests it through response_format so
+        providers that support JSON mode constrain decoding to the schema. It
+        includes retry logic to handle validation failures, providing error
+        feedback to the model for self-correction.
+        
+        If the config sets draft_model, that model answers first and the
+        configured model is only called when the draft's response fails. A
+        draft that keeps failing for a given response_model is skipped.
         
         Args:
             user_prompt: The user's message/prompt
             response_model: Pydantic model class defining the expected structure
             max_retries: Maximum number of retry attempts for validation failures (default: 3)
+            model: Optional model overriding the default config for this call
+            temperature: Optional temperature for this call; structured calls
+                otherwise run at temperature 0
+            max_tokens: Optional output token limit for this call; otherwise the
+                config's limit, or an estimate from the schema size
             
         Returns:
             Instance of response_model populated with the validated API response
             
         Raises:
-            ValidationError: If the response cannot be validated after max_retries
-            RuntimeError: If the API request fails
+            ValidationError: The last validation error, if no attempt produced a
+                valid response
+            ValueError: If max_retries is less than 1, or the prompt does not fit
+                in the model's context window
+            openai.OpenAIError: If the API request fails after the SDK's retries
             
         Example:
             >>> class Person(BaseModel):
@@ -213,66 +1297,48 @@ class OpenRouterClient:
             ... )
             >>> print(person.name, person.age)
         """
-        config = self.default_config
-        
-        # Generate JSON schema from Pydantic model
-        schema = response_model.model_json_schema()
-        
-        # Create enhanced system prompt with schema instructions
-        schema_instruction = (
-            f"You must respond with valid JSON that matches this exact schema:\n"
-            f"{json.dumps(schema, indent=2)}\n\n"
-            f"Respond ONLY with the JSON object, no additional text or markdown formatting."
+        return self._run_steps(
+            self._structured_steps(
+                user_prompt, response_model, max_retries, model, temperature, max_tokens
+            )
         )
+    
+    async def agenerate_structured(
+        self,
+        user_prompt: str,
+        response_model: Type[T],
+        max_retries: int = 3,
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> T:
+        """
+        Async version of generate_structured using the async client.
         
-        base_system_prompt = config.system_prompt or ""
-        enhanced_system_prompt = f"{base_system_prompt}\n\n{schema_instruction}".strip()
-        
-        messages = [
-            {"role": "system", "content": enhanced_system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-        
-        last_error = None
-        response_text = None
-        
-        for attempt in range(max_retries):
-            try:
-                api_params = config.to_api_params()
-                completion = self.client.chat.completions.create(
-                    model=config.model,
-                    messages=messages,
-                    **api_params
-                )
-                
-                response_text = completion.choices[0].message.content
-                
-                # Try to extract JSON from response (handle markdown code blocks)
-                json_text = self._extract_json(response_text)
-                
-                # Parse and validate with Pydantic
-                parsed_data = json.loads(json_text)
-                validated_response = response_model.model_validate(parsed_data)
-                
-                return validated_response
-                
-            except (json.JSONDecodeError, ValidationError) as e:
-                last_error = e
-                if attempt < max_retries - 1:
-                    # Add error feedback to messages for retry
-                    error_msg = (
-                        f"Your previous response was invalid. Error: {str(e)}\n"
-                        f"Please provide a valid JSON response matching the schema exactly."
-                    )
-                    messages.append({"role": "assistant", "content": response_text})
-                    messages.append({"role": "user", "content": error_msg})
-            except Exception as e:
-                raise RuntimeError(f"API request failed: {str(e)}")
-        
-        # If we get here, all retries failed
-        raise ValidationError(
-            f"Failed to generate valid structured output after {max_retries} attempts. "
-            f"Last error: {str(last_error)}"
+        Args:
+            user_prompt: The user's message/prompt
+            response_model: Pydantic model class defining the expected structure
+            max_retries: Maximum number of retry attempts for validation failures (default: 3)
+            model: Optional model overriding the default config for this call
+            temperature: Optional temperature for this call; structured calls
+                otherwise run at temperature 0
+            max_tokens: Optional output token limit for this call; otherwise the
+                config's limit, or an estimate from the schema size
+            
+        Returns:
+            Instance of response_model populated with the validated API response
+            
+        Raises:
+            ValidationError: The last validation error, if no attempt produced a
+                valid response
+            ValueError: If max_retries is less than 1, or the prompt does not fit
+                in the model's context window
+            openai.OpenAIError: If the API request fails after the SDK's retries
+        """
+        return await self._arun_steps(
+            self._structured_steps(
+                user_prompt, response_model, max_retries, model, temperature, max_tokens
+            )
         )
     
     def generate_structured_list(
@@ -307,18 +1373,130 @@ class OpenRouterClient:
             >>> for task in tasks:
             ...     print(f"{task.name} - {task.priority}")
         """
-        # Create a wrapper model for the list
-        class ListWrapper(BaseModel):
-            items: List[item_model]
-        
         result = self.generate_structured(
             user_prompt=user_prompt,
-            response_model=ListWrapper,
+            response_model=_list_wrapper(item_model),
             max_retries=max_retries
         )
         
         return result.items
     
+    def batch_generate(
+        self,
+        prompts: List[str],
+        response_model: Type[T],
+        max_prefill_tokens: int = DEFAULT_MAX_PREFILL_TOKENS,
+        max_retries: int = 3
+    ) -> List[T]:
+        """
+        Answer several independent prompts with as few requests as possible.
+        
+        Prompts are packed into numbered tasks within a single user message and
+        the model returns one item per task, so a batch costs one round-trip and
+        one prefill. Prompts are split into sub-batches whose estimated size
+        stays under max_prefill_tokens. If a response has the wrong number of
+        items, that sub-batch is answered one prompt at a time instead.
+        
+        Args:
+            prompts: Independent user prompts
+            response_model: Pydantic model class for each answer
+            max_prefill_tokens: Estimated token budget for the tasks in one request
+            max_retries: Maximum number of retry attempts per request (default: 3)
+            
+        Returns:
+            One validated response_model instance per prompt, in order
+            
+        Example:
+            >>> class Sentiment(BaseModel):
+            ...     label: str
+            >>> client = OpenRouterClient()
+            >>> labels = client.batch_generate(
+            ...     ["I love it", "Terrible service"],
+            ...     Sentiment
+            ... )
+        """
+        config = self.default_config
+        item_tokens = _estimate_max_tokens(response_model)
+        max_items = max(1, (config.max_tokens or _MAX_BATCH_OUTPUT_TOKENS) // item_tokens)
+        
+        # Input and output of a batch must fit together in a known context window,
+        # next to the system prompt that carries the wrapper schema
+        context = _CONTEXT_BY_MODEL.get(config.model)
+        context_budget = None
+        if context is not None:
+            overhead = _count_message_tokens(
+                self._structured_messages(config, "", _list_wrapper(response_model))
+            )
+            context_budget = context - overhead
+        
+        results: List[T] = []
+        batches = self._prompt_batches(
+            prompts, max_prefill_tokens, item_tokens, max_items, context_budget
+        )
+        for batch in batches:
+            if len(batch) == 1:
+                results.append(self.generate_structured(batch[0], response_model, max_retries))
+                continue
+            
+            tasks = "\n\n".join(f"[{i}] {prompt}" for i, prompt in enumerate(batch, 1))
+            user_prompt = (
+                f"Answer each of the following {len(batch)} tasks independently. "
+                f"Return exactly one entry in \"items\" per task, in the same order.\n\n"
+                f"{tasks}"
+            )
+            # The schema-based output estimate covers one item, not the whole batch
+            max_tokens = config.max_tokens or item_tokens * len(batch)
+            wrapper = self.generate_structured(
+                user_prompt,
+                _list_wrapper(response_model),
+                max_retries,
+                max_tokens=max_tokens
+            )
+            if len(wrapper.items) == len(batch):
+                results.extend(wrapper.items)
+            else:
+                results.extend(
+                    self.generate_structured(prompt, response_model, max_retries)
+                    for prompt in batch
+                )
+        return results
+    
+    @staticmethod
+    def _prompt_batches(
+        prompts: List[str],
+        max_prefill_tokens: int,
+        item_tokens: int,
+        max_items: int,
+        context_budget: Optional[int] = None
+    ) -> Iterator[List[str]]:
+        """
+        Split prompts into consecutive batches within estimated token budgets.
+        
+        A batch holds at most max_items prompts, its task text stays under
+        max_prefill_tokens and, when context_budget is given, its task text plus
+        item_tokens of output per prompt stays under context_budget. A prompt
+        that exceeds a budget on its own is still yielded, alone.
+        """
+        batch: List[str] = []
+        used = 0
+        for prompt in prompts:
+            # Each task also carries its "[n] " label and separator
+            tokens = _estimate_tokens(prompt) + _TOKENS_PER_MESSAGE
+            if batch and (
+                len(batch) >= max_items
+                or used + tokens > max_prefill_tokens
+                or (
+                    context_budget is not None
+                    and used + tokens + item_tokens * (len(batch) + 1) > context_budget
+                )
+            ):
+                yield batch
+                batch, used = [], 0
+            batch.append(prompt)
+            used += tokens
+        if batch:
+            yield batch
+    
     @staticmethod
     def _extract_json(text: str) -> str:
         """
@@ -340,13 +1518,5 @@ class OpenRouterClient:
         text = text.strip()
         
         # Remove markdown code blocks if present
-        if text.startswith("```"):
-            lines = text.split("\n")
-            # Remove first line (```json or ```)
-            lines = lines[1:]
-            # Remove last line if it's ```
-            if lines and lines[-1].strip() == "```":
-                lines = lines[:-1]
-            text = "\n".join(lines).strip()
-        
-        return text
+        match = _FENCE_RE.match(text)
+        return match.group(1).strip() if match else text
@@ -1,33 +1,23 @@
-from openai import OpenAI
-import os
+import sys
 
-client = OpenAI(
-  base_url="https://openrouter.ai/api/v1",
-  api_key=os.getenv("OPENROUTER_API_KEY")
-)
+from openrouter_text_client import OpenRouterClient
 
-model="meta-llama/llama-4-maverick:free"
-model="qwen/qwen2.5-vl-32b-instruct:free"
+# Alternative: "meta-llama/llama-4-maverick:free"
+MODEL = "qwen/qwen2.5-vl-32b-instruct:free"
 
-completion = client.chat.completions.create(
-  extra_body={},
-  model=model,
-  messages=[
-    {
-      "role": "user",
-      "content": [
-        {
-          "type": "text",
-          "text": "What is in this image?"
-        },
-        {
-          "type": "image_url",
-          "image_url": {
-            "url": "https://upload.wikimedia.org/wikipedia/commons/thumb/d/dd/Gfp-wisconsin-madison-the-nature-boardwalk.jpg/2560px-Gfp-wisconsin-madison-the-nature-boardwalk.jpg"
-          }
-        }
-      ]
-    }
-  ]
-)
-print(completion.choices[0].message.content)
+IMAGE_URL = "https://upload.wikimedia.org/wikipedia/commons/thumb/d/dd/Gfp-wisconsin-madison-the-nature-boardwalk.jpg/2560px-Gfp-wisconsin-madison-the-nature-boardwalk.jpg"
+
+def main():
+    """
+    Ask a vision model about an image on OpenRouter.
+    """
+    if len(sys.argv) > 1:
+        prompt = sys.argv[1]
+    else:
+        prompt = "What is in this image?"
+
+    client = OpenRouterClient()
+    print(client.generate_vision(prompt, IMAGE_URL, model=MODEL, inline_image=True))
+
+if __name__ == "__main__":
+    main()